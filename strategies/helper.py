@@ -1,5 +1,234 @@
+from collections import deque
+
+import numpy as np
 import pandas as pd
 
+try:
+    from numba import njit, prange
+except ImportError:
+    # Numba is optional: without it the kernels below run as plain Python loops
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+    prange = range
+
+
+# Kernels declare their signatures, so Numba compiles them eagerly when this
+# module is imported (or loads them from the on-disk cache) rather than on the
+# first trading iteration. A call that matches no signature raises instead of
+# compiling, so array arguments are typed for everything pandas hands out:
+# to_numpy() may return read-only and non-contiguous arrays. Writable,
+# contiguous arrays match the same signatures.
+_VECTOR = "Array(float64, 1, 'A', readonly=True)"
+_MATRIX = "Array(float64, 2, 'A', readonly=True)"
+
+
+@njit(f"f8[:]({_VECTOR}, i8)", cache=True)
+def _wilder_mean(values, period):
+    """
+    Wilder's smoothing: seeded with a simple mean, then a 1/period recurrence.
+    Leading NaNs are skipped.
+    """
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    start = 0
+    while start < n and np.isnan(values[start]):
+        start += 1
+    if n - start < period:
+        return out
+
+    avg = 0.0
+    for i in range(start, start + period):
+        avg += values[i]
+    avg /= period
+    out[start + period - 1] = avg
+    for i in range(start + period, n):
+        avg = (avg * (period - 1) + values[i]) / period
+        out[i] = avg
+    return out
+
+
+@njit(f"f8[:]({_VECTOR}, i8)", cache=True)
+def _ema(values, span):
+    """
+    Exponential moving average with the weights of pandas' ewm(span=span).
+    """
+    decay = 1.0 - 2.0 / (span + 1)
+    out = np.empty(values.shape[0])
+    num = 0.0
+    den = 0.0
+    for i in range(values.shape[0]):
+        num = values[i] + decay * num
+        den = 1.0 + decay * den
+        out[i] = num / den
+    return out
+
+
+def _true_range(high, low, close):
+    """
+    True range per bar; the first bar has no previous close and uses high - low.
+    """
+    prev_close = np.concatenate(([np.nan], close[:-1]))
+    # np.fmax skips the NaN of the first bar instead of propagating it
+    return np.fmax.reduce([high - low, np.abs(high - prev_close), np.abs(low - prev_close)])
+
+
+@njit(f"f8({_VECTOR}, {_VECTOR}, {_VECTOR}, i8)", cache=True, nogil=True)
+def _atr_last(high, low, close, period):
+    """
+    Latest Wilder ATR in one pass, without materialising the true range.
+    """
+    n = close.shape[0]
+    if n < period:
+        return np.nan
+
+    avg = 0.0
+    for i in range(n):
+        tr = high[i] - low[i]
+        if i > 0:
+            tr = max(tr, abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        if i < period:
+            avg += tr
+            if i == period - 1:
+                avg /= period
+        else:
+            avg = (avg * (period - 1) + tr) / period
+    return avg
+
+
+@njit(f"f8({_VECTOR}, i8)", cache=True, nogil=True)
+def _rsi_last(close, period):
+    """
+    Latest Wilder RSI in one pass over the closes.
+    """
+    n = close.shape[0]
+    if n <= period:
+        return np.nan
+
+    gain = 0.0
+    loss = 0.0
+    for i in range(1, n):
+        delta = close[i] - close[i - 1]
+        up = delta if delta > 0 else 0.0
+        down = -delta if delta < 0 else 0.0
+        if i <= period:
+            gain += up
+            loss += down
+            if i == period:
+                gain /= period
+                loss /= period
+        else:
+            gain = (gain * (period - 1) + up) / period
+            loss = (loss * (period - 1) + down) / period
+    if gain + loss == 0:
+        return np.nan
+    return 100 * gain / (gain + loss)
+
+
+@njit(f"f8({_VECTOR}, {_VECTOR}, {_VECTOR}, i8)", cache=True, nogil=True)
+def _adx_last(high, low, close, period):
+    """
+    Latest ADX in one fused pass: true range, directional movement, their
+    Wilder averages and the smoothed DX are all carried as running scalars.
+    """
+    n = close.shape[0]
+    if n < 2 * period:
+        return np.nan
+
+    tr_avg = 0.0
+    plus_avg = 0.0
+    minus_avg = 0.0
+    adx = 0.0
+    for i in range(1, n):
+        tr = max(high[i] - low[i], abs(high[i] - close[i - 1]), abs(low[i] - close[i - 1]))
+        up = high[i] - high[i - 1]
+        down = low[i - 1] - low[i]
+        plus_dm = up if up > down and up > 0 else 0.0
+        minus_dm = down if down > up and down > 0 else 0.0
+
+        if i < period:
+            tr_avg += tr
+            plus_avg += plus_dm
+            minus_avg += minus_dm
+            continue
+        if i == period:
+            tr_avg = (tr_avg + tr) / period
+            plus_avg = (plus_avg + plus_dm) / period
+            minus_avg = (minus_avg + minus_dm) / period
+        else:
+            tr_avg = (tr_avg * (period - 1) + tr) / period
+            plus_avg = (plus_avg * (period - 1) + plus_dm) / period
+            minus_avg = (minus_avg * (period - 1) + minus_dm) / period
+
+        # Flat prices leave DX undefined, as the array version's 0/0 does
+        dx = np.nan
+        if tr_avg != 0:
+            plus_di = 100 * plus_avg / tr_avg
+            minus_di = 100 * minus_avg / tr_avg
+            if plus_di + minus_di != 0:
+                dx = 100 * abs(plus_di - minus_di) / (plus_di + minus_di)
+
+        k = i - period
+        if k < period - 1:
+            adx += dx
+        elif k == period - 1:
+            adx = (adx + dx) / period
+        else:
+            adx = (adx * (period - 1) + dx) / period
+    return adx
+
+
+@njit(f"f8[:]({_MATRIX}, i8, i8)", cache=True, nogil=True, parallel=True)
+def _momentum_scores(closes, vol_window, min_periods):
+    """
+    Momentum over volatility for each column of a (bars, assets) matrix.
+    NaNs mark bars an asset has no data for and are skipped.
+    """
+    n_bars, n_assets = closes.shape
+    out = np.full(n_assets, np.nan)
+    for j in prange(n_assets):
+        first = np.nan
+        for i in range(n_bars):
+            if not np.isnan(closes[i, j]):
+                first = closes[i, j]
+                break
+        last = np.nan
+        for i in range(n_bars - 1, -1, -1):
+            if not np.isnan(closes[i, j]):
+                last = closes[i, j]
+                break
+
+        start = max(n_bars - vol_window, 0)
+        count = 0
+        mean = 0.0
+        for i in range(start, n_bars):
+            if not np.isnan(closes[i, j]):
+                count += 1
+                mean += closes[i, j]
+        if count < max(min_periods, 2):
+            continue
+        mean /= count
+        var = 0.0
+        for i in range(start, n_bars):
+            if not np.isnan(closes[i, j]):
+                var += (closes[i, j] - mean) ** 2
+        if var == 0:
+            continue  # Flat prices; the score is undefined and left as NaN
+        out[j] = (last / first - 1) / np.sqrt(var / (count - 1))
+    return out
+
+
+def last_sma(values, period):
+    """
+    Latest simple moving average, averaging only the last `period` values.
+    NaN with fewer than `period` values, like rolling(period).mean().
+    """
+    if len(values) < period:
+        return np.nan
+    return float(values[-period:].mean())
+
 def calculate_rsi(prices, period=14):
     """
     Calculate the Relative Strength Index (RSI).
@@ -7,49 +236,192 @@ def calculate_rsi(prices, period=14):
     if len(prices) < period:
         return None
 
-    delta = prices.diff()
-    gain = delta.where(delta > 0, 0).rolling(window=period).mean()
-    loss = -delta.where(delta < 0, 0).rolling(window=period).mean()
-    rs = gain / loss
-    return 100 - 100 / (1 + rs)
+    close = prices.to_numpy(dtype=np.float64)
+    delta = np.diff(close, prepend=np.nan)
+    gain = _wilder_mean(np.maximum(delta, 0.0), period)
+    loss = _wilder_mean(np.maximum(-delta, 0.0), period)
+    # Same as 100 - 100 / (1 + gain / loss) without dividing by a zero loss
+    with np.errstate(invalid="ignore"):
+        rsi = 100 * gain / (gain + loss)
+    return pd.Series(rsi, index=prices.index)
+
+def calculate_rsi_last(prices, period=14):
+    """
+    Latest value of calculate_rsi, or NaN when it is not defined yet.
+    """
+    return _rsi_last(prices.to_numpy(dtype=np.float64), period)
 
 def calculate_atr(df, period=14):
     """
     Calculate the Average True Range (ATR).
     """
-    tr = pd.concat([
-        df["high"] - df["low"],
-        abs(df["high"] - df["close"].shift(1)),
-        abs(df["low"] - df["close"].shift(1))
-    ],
-                    axis=1).max(axis=1)
+    high = df["high"].to_numpy(dtype=np.float64)
+    low = df["low"].to_numpy(dtype=np.float64)
+    close = df["close"].to_numpy(dtype=np.float64)
+    tr = _true_range(high, low, close)
 
-    atr = tr.rolling(window=period).mean()
-    atr.dropna(inplace=True)  # Handle NaN values
-    return atr
+    atr = _wilder_mean(tr, period)
+    valid = ~np.isnan(atr)  # Handle NaN values before building the Series
+    return pd.Series(atr[valid], index=df.index[valid])
+
+def calculate_atr_last(df, period=14):
+    """
+    Latest value of calculate_atr, or NaN with fewer than `period` bars.
+    """
+    return _atr_last(
+        df["high"].to_numpy(dtype=np.float64),
+        df["low"].to_numpy(dtype=np.float64),
+        df["close"].to_numpy(dtype=np.float64),
+        period,
+    )
+
+def calculate_momentum_scores(closes, vol_window=20, min_periods=2):
+    """
+    Risk-adjusted momentum per column of a wide close-price frame: the
+    return from first to last close over the std of the last vol_window bars.
+    Columns with fewer than min_periods closes in that window score NaN.
+    """
+    scores = _momentum_scores(closes.to_numpy(dtype=np.float64), vol_window, min_periods)
+    return pd.Series(scores, index=closes.columns)
 
 def calculate_adx(df, period=14):
     """
     Calculate the Average Directional Index (ADX).
     """
-    high, low, close = df["high"], df["low"], df["close"]
-    tr = pd.concat([high - low, abs(high - close.shift(1)), abs(low - close.shift(1))], axis=1).max(axis=1)
-    atr = tr.rolling(window=period).mean()
+    high = df["high"].to_numpy(dtype=np.float64)
+    low = df["low"].to_numpy(dtype=np.float64)
+    close = df["close"].to_numpy(dtype=np.float64)
+    tr = _true_range(high, low, close)
+    tr[0] = np.nan  # Start at the same bar as the directional movement
+
+    # Directional movement from the raw diffs, so neither mask sees the other
+    up = np.diff(high, prepend=np.nan)
+    down = -np.diff(low, prepend=np.nan)
+    plus_dm = np.where((up > down) & (up > 0), up, 0.0)
+    minus_dm = np.where((down > up) & (down > 0), down, 0.0)
+    plus_dm[0] = minus_dm[0] = np.nan
 
-    plus_dm = high.diff()
-    minus_dm = low.diff()
-    plus_dm = plus_dm.where((plus_dm > minus_dm) & (plus_dm > 0), 0)
-    minus_dm = minus_dm.where((minus_dm > plus_dm) & (minus_dm > 0), 0)
+    atr = _wilder_mean(tr, period)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        plus_di = 100 * _wilder_mean(plus_dm, period) / atr
+        minus_di = 100 * _wilder_mean(minus_dm, period) / atr
+        dx = 100 * np.abs(plus_di - minus_di) / (plus_di + minus_di)
+    return pd.Series(_wilder_mean(dx, period), index=df.index)
 
-    plus_di = 100 * (plus_dm.rolling(window=period).mean() / atr)
-    minus_di = 100 * (minus_dm.rolling(window=period).mean() / atr)
-    dx = (abs(plus_di - minus_di) / (plus_di + minus_di)) * 100
-    return dx.rolling(window=period).mean()
+def calculate_adx_last(df, period=14):
+    """
+    Latest value of calculate_adx, or NaN when it is not defined yet.
+    """
+    return _adx_last(
+        df["high"].to_numpy(dtype=np.float64),
+        df["low"].to_numpy(dtype=np.float64),
+        df["close"].to_numpy(dtype=np.float64),
+        period,
+    )
 
 def calculate_macd(prices, short_period=12, long_period=26, signal_period=9):
     """Calculate MACD line and Signal line."""
-    ema_short = prices.ewm(span=short_period).mean()
-    ema_long = prices.ewm(span=long_period).mean()
-    macd = ema_short - ema_long
-    signal = macd.ewm(span=signal_period).mean()
-    return macd, signal
\ No newline at end of file
+    close = prices.to_numpy(dtype=np.float64)
+    macd = _ema(close, short_period) - _ema(close, long_period)
+    signal = _ema(macd, signal_period)
+    return pd.Series(macd, index=prices.index), pd.Series(signal, index=prices.index)
+
+
+class SMAState:
+    """
+    Simple moving average updated one bar at a time with a running sum.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+
+    def update(self, value):
+        if len(self.window) == self.period:
+            self.total -= self.window[0]
+        self.window.append(value)
+        self.total += value
+        return self.value
+
+    @property
+    def ready(self):
+        return len(self.window) == self.period
+
+    @property
+    def value(self):
+        return self.total / self.period if self.ready else float("nan")
+
+
+class WilderState:
+    """
+    Wilder's smoothing updated one bar at a time, seeded like _wilder_mean.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.count = 0
+        self.avg = 0.0
+
+    def update(self, value):
+        if self.count < self.period:
+            self.avg += value / self.period
+            self.count += 1
+        else:
+            self.avg = (self.avg * (self.period - 1) + value) / self.period
+        return self.value
+
+    @property
+    def ready(self):
+        return self.count >= self.period
+
+    @property
+    def value(self):
+        return self.avg if self.ready else float("nan")
+
+
+class RSIState:
+    """
+    Incremental counterpart of calculate_rsi.
+    """
+
+    def __init__(self, period=14):
+        self.gain = WilderState(period)
+        self.loss = WilderState(period)
+        self.prev_close = None
+
+    def update(self, close):
+        if self.prev_close is not None:
+            delta = close - self.prev_close
+            self.gain.update(max(delta, 0.0))
+            self.loss.update(max(-delta, 0.0))
+        self.prev_close = close
+        return self.value
+
+    @property
+    def value(self):
+        if not self.gain.ready or self.gain.avg + self.loss.avg == 0:
+            return float("nan")
+        return 100 * self.gain.avg / (self.gain.avg + self.loss.avg)
+
+
+class ATRState:
+    """
+    Incremental counterpart of calculate_atr.
+    """
+
+    def __init__(self, period=14):
+        self.tr = WilderState(period)
+        self.prev_close = None
+
+    def update(self, high, low, close):
+        tr = high - low
+        if self.prev_close is not None:
+            tr = max(tr, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.prev_close = close
+        return self.tr.update(tr)
+
+    @property
+    def value(self):
+        return self.tr.value
+
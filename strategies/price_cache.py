@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from lumibot.entities.asset import Asset
+
+
+class PriceCacheMixin:
+    """
+    Broker-side plumbing shared by the strategies: one Asset per symbol, a
+    thread pool for per-symbol calls and historical prices cached per trading
+    day. Call _init_price_cache from initialize.
+    """
+
+    def _init_price_cache(self, symbols):
+        # Per-symbol fetches block on network I/O, so they run on a pool
+        self._pool = ThreadPoolExecutor(max_workers=min(8, len(symbols)))
+
+        # One Asset per symbol, reused for every fetch and order
+        self._assets = {stock: Asset(symbol=stock) for stock in symbols}
+
+        # Historical prices keyed by (symbol, length), valid for one trading day.
+        # Every fetch asks for daily bars explicitly: get_historical_prices_for_assets
+        # defaults to minute bars, and both paths fill the same cache entries
+        self._price_cache = {}
+        self._price_cache_date = None
+
+    def _get_asset(self, stock):
+        asset = self._assets.get(stock)
+        if asset is None:
+            asset = self._assets[stock] = Asset(symbol=stock)
+        return asset
+
+    def _price_cache_for_today(self):
+        """
+        Return the price cache, dropping entries left over from a previous day.
+        """
+        today = self.get_datetime().date()
+        if self._price_cache_date != today:
+            self._price_cache.clear()
+            self._price_cache_date = today
+        return self._price_cache
+
+    def _cached_prices(self, stock, length):
+        """
+        Fetch historical prices once per trading day and reuse the DataFrame.
+        """
+        cache = self._price_cache_for_today()
+        key = (stock, length)
+        if key not in cache:
+            bars = self.get_historical_prices(self._get_asset(stock), length=length, timestep="day")
+            cache[key] = bars.df if bars else None
+        return cache[key]
+
+    def _prefetch_prices(self, symbols, length):
+        """
+        Warm the price cache for several symbols at once, in a single batched
+        request when the data source supports it and on the pool otherwise.
+        """
+        cache = self._price_cache_for_today()
+        missing = [stock for stock in symbols if (stock, length) not in cache]
+        if len(missing) < 2:
+            return
+
+        try:
+            bars_by_asset = self.get_historical_prices_for_assets(
+                [self._get_asset(stock) for stock in missing], length=length, timestep="day")
+        except Exception:
+            bars_by_asset = None
+        if bars_by_asset:
+            for stock in missing:
+                asset = self._get_asset(stock)
+                if asset in bars_by_asset:  # Anything absent is retried by _cached_prices
+                    bars = bars_by_asset[asset]
+                    cache[(stock, length)] = bars.df if bars else None
+            return
+
+        futures = {
+            stock: self._pool.submit(self.get_historical_prices, self._get_asset(stock), length=length, timestep="day")
+            for stock in missing
+        }
+        for stock, future in futures.items():
+            try:
+                bars = future.result()
+            except Exception:
+                continue  # Left uncached so _cached_prices retries and reports it
+            cache[(stock, length)] = bars.df if bars else None
+
+    def _clear_price_cache(self):
+        """
+        Drop today's bars once the market has closed instead of holding them
+        overnight.
+        """
+        self._price_cache.clear()
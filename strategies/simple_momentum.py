@@ -1,8 +1,12 @@
 from lumibot.strategies.strategy import Strategy
-from lumibot.entities.asset import Asset
+import logging
+import numpy as np
 import pandas as pd
 from enum import Enum
-from strategies.helper import calculate_atr, calculate_rsi
+from strategies.price_cache import PriceCacheMixin
+from strategies.helper import ATRState, RSIState, SMAState, calculate_atr_last, calculate_momentum_scores, last_sma
+
+logger = logging.getLogger(__name__)
 
 
 class MarketCondition(Enum):
@@ -14,7 +18,7 @@ class MarketCondition(Enum):
     Neutral = "Neutral"
 
 
-class SimpleMomentumBot(Strategy):
+class SimpleMomentumBot(PriceCacheMixin, Strategy):
 
     def initialize(self):
         self.sleeptime = "1D"  # Run once per day
@@ -30,6 +34,17 @@ class SimpleMomentumBot(Strategy):
         
         self.day_trades_count = {"buy": 0, "sell": 0}
 
+        self._init_price_cache(self.universe + ["SPY"])
+
+        # Incremental SPY indicators for the market filter
+        self._spy_state = None
+        self._spy_last_bar = None
+        self._spy_state_date = None
+
+        # Market condition for the current trading day
+        self._market_condition = None
+        self._market_condition_date = None
+
     def before_market_opens(self):
         self.log_message("Before Market Opens")
         self.log_message(
@@ -43,58 +58,66 @@ class SimpleMomentumBot(Strategy):
         """
         Main trading logic.
         """
-        # Get the current market condition
-        market_condition = self.determine_market_condition()
-        # print(f"{market_condition} market condition detected.")
+        # Read the portfolio value once; each getter may hit the broker
+        portfolio_value = self.get_portfolio_value()
 
         # Calculate current drawdown
-        drawdown = self.calculate_drawdown()
+        drawdown = self.calculate_drawdown(portfolio_value)
         self.log_message(f"Current Drawdown: {drawdown:.2f}%")
 
-        # Stop trading if drawdown exceeds the threshold
+        # Stop trading if drawdown exceeds the threshold; checked first since
+        # it needs no market data
         if drawdown < -20:
             self.log_message("Drawdown exceeds -20%. Pausing trading.")
             return
 
+        # Get the current market condition
+        market_condition = self.determine_market_condition()
+        # print(f"{market_condition} market condition detected.")
+
         if market_condition == MarketCondition.Bearish:
             self.log_message("Bear market detected. Pausing trading.")
             return
         elif market_condition == MarketCondition.Bullish:
-            self.regular_momentum_strategy()
+            self.regular_momentum_strategy(
+                portfolio_value=portfolio_value, cash=self.get_cash())
         else:
             # Neutral market condition - limit trades or hold cash
             self.log_message(
                 "Neutral market detected. Holding cash or limiting trades."
             )
 
-    def regular_momentum_strategy(self, asset=None):
+    def regular_momentum_strategy(self, asset=None, portfolio_value=None, cash=None):
         """
         Regular momentum strategy.
         """
-        # Rank assets by risk-adjusted return
-        ranked_assets = asset or self.rank_assets()
-        top_assets = ranked_assets[:3]  # Limit to top 3 assets
+        if portfolio_value is None:
+            portfolio_value = self.get_portfolio_value()
+        if cash is None:
+            cash = self.get_cash()
 
-        for index, stock in enumerate(top_assets):
-            try:
-                # Fetch historical data
-                bars = self.get_historical_prices(stock, length=252)
-                df = bars.df
-            except Exception as e:
-                self.log_message(f"Error fetching data for {stock}: {e}")
-                continue
+        # Rank assets by risk-adjusted return, limited to the top 3
+        top_assets = asset[:3] if asset else self.rank_assets(top_n=3)
 
-            # Calculate SMAs and ATR
-            sma_short_period, sma_long_period = self.get_asset_sma_periods(
-                stock)
-            sma_short = df["close"].rolling(sma_short_period).mean().iloc[-1]
-            sma_long = df["close"].rolling(sma_long_period).mean().iloc[-1]
-            atr = calculate_atr(df).iloc[-1]
+        # Resolve SMA windows up front rather than once per worker call
+        sma_config = self.asset_specific_sma
+        default_periods = sma_config["default"]
+        sma_periods = [sma_config.get(stock, default_periods) for stock in top_assets]
 
-            # Get the last price and current position
-            last_price = self.get_last_price(stock)
-            position = self.get_position(stock)
-            current_quantity = position.quantity if position else 0
+        # Gather signals concurrently; orders are still placed one at a time
+        signals = self._pool.map(self._evaluate_stock, top_assets, sma_periods)
+
+        for stock, signal in zip(top_assets, signals):
+            if signal is None:
+                continue
+            if signal["action"] == "sell":
+                self.day_trades_count["sell"] += 1
+                self.close_position(stock, signal["position"])
+                continue
+
+            # Buy signal: size the position from ATR and the last price
+            atr = signal["atr"]
+            last_price = signal["last_price"]
 
             # Safeguard checks for valid data
             if atr <= 0 or last_price <= 0:
@@ -104,15 +127,14 @@ class SimpleMomentumBot(Strategy):
                 continue
 
             # Calculate maximum risk per trade as 2% of portfolio value
-            portfolio_risk = self.risk_per_trade * self.get_portfolio_value()
-            max_risk = min(portfolio_risk, self.get_cash(
-            ))  # Use the smaller of portfolio risk or available cash
+            portfolio_risk = self.risk_per_trade * portfolio_value
+            max_risk = min(portfolio_risk, cash)  # Use the smaller of portfolio risk or available cash
 
             # Calculate position size
             risk_per_share = atr * self.stop_loss_multiplier
             if risk_per_share > 0:
                 quantity = int(max_risk / risk_per_share)
-                max_quantity_by_cash = int(self.get_cash() / last_price)
+                max_quantity_by_cash = int(cash / last_price)
                 quantity = min(quantity, max_quantity_by_cash
                                )  # Ensure quantity fits within available cash
             else:
@@ -121,26 +143,68 @@ class SimpleMomentumBot(Strategy):
                 )
                 continue
 
-            # Log calculation details for debugging
+            # Log calculation details for debugging; formatted only when enabled
+            logger.debug(
+                "Calculated quantity for %s: %s, Last Price: %s, Max Risk: %s, Risk per Share: %s, ATR: %s, Portfolio Value: %s, Cash: %s",
+                stock, quantity, last_price, max_risk, risk_per_share, atr, portfolio_value, cash
+            )
+
+            self.day_trades_count["buy"] += 1
+            self.place_trade(stock, quantity, last_price)
+
+        # Log trades for the day
+        if self.day_trades_count["buy"] > 0 or self.day_trades_count["sell"] > 0:
             self.log_message(
-                f"Calculated quantity for {stock}: {quantity}, Last Price: {last_price},Max Risk: {max_risk}, Risk per Share: {risk_per_share}, ATR: {atr}, Portfolio Value: {self.get_portfolio_value()}, Cash: {self.get_cash()}"
+                f"Trades for day: Buy: {self.day_trades_count['buy']}, Sell: {self.day_trades_count['sell']}"
             )
+        else:
+            self.log_message(f"No trades for today.")
 
-            # Trading logic
-            if sma_short > sma_long and current_quantity == 0:
-                self.day_trades_count["buy"] += 1
-                self.place_trade(stock, quantity)
-            elif sma_short < sma_long and current_quantity > 0:
-                self.day_trades_count["sell"] += 1
-                self.close_position(stock)
+    def _evaluate_stock(self, stock, sma_periods=None):
+        """
+        Work out the trade signal for one stock. Runs on the thread pool, so it
+        only reads data; returns None when there is nothing to do.
+        """
+        try:
+            # Fetch historical data
+            df = self._cached_prices(stock, length=252)
+        except Exception as e:
+            self.log_message(f"Error fetching data for {stock}: {e}")
+            return None
+        if df is None:
+            self.log_message(f"No historical data for {stock}. Skipping.")
+            return None
+
+        # Calculate SMAs
+        if sma_periods is None:
+            sma_periods = self.get_asset_sma_periods(stock)
+        sma_short_period, sma_long_period = sma_periods
+        close = df["close"].to_numpy(dtype=np.float64)
+        if len(close) < sma_long_period:
+            self.log_message(f"Not enough history for {stock}. Skipping.")
+            return None
+        sma_short = last_sma(close, sma_short_period)
+        sma_long = last_sma(close, sma_long_period)
+
+        # Without a crossover there is nothing to trade, so skip the
+        # broker calls and ATR entirely; a missing close in either window
+        # leaves the SMA undefined, which is no crossover either
+        if not (np.isfinite(sma_short) and np.isfinite(sma_long)) or sma_short == sma_long:
+            return None
 
-            # Log trades for the day
-            if self.day_trades_count["buy"] > 0 or self.day_trades_count["sell"] > 0:
-                self.log_message(
-                    f"Trades for day: Buy: {self.day_trades_count['buy']}, Sell: {self.day_trades_count['sell']}"
-                )
-            else:
-                self.log_message(f"No trades for today.")
+        position = self.get_position(stock)
+        current_quantity = position.quantity if position else 0
+
+        if sma_short < sma_long:
+            return {"action": "sell", "position": position} if current_quantity > 0 else None
+        if current_quantity != 0:
+            return None
+
+        return {
+            "action": "buy",
+            "atr": calculate_atr_last(df),
+            "last_price": self.get_last_price(stock),
+        }
 
     def after_market_closes(self):
         self.log_message("The market is closed")
@@ -151,6 +215,7 @@ class SimpleMomentumBot(Strategy):
         self.log_message(
             f"Potential market condition: {self.determine_market_condition()}")
         self.reset_day_trades_count()
+        self._clear_price_cache()
         
     def on_bot_crash(self, error):
         """
@@ -170,8 +235,9 @@ class SimpleMomentumBot(Strategy):
                 self.log_message(f"Position still open: {stock}, Quantity: {position.quantity}")
 
 
-    def place_trade(self, stock, quantity):
-        last_price = self.get_last_price(stock)
+    def place_trade(self, stock, quantity, last_price=None):
+        if last_price is None:
+            last_price = self.get_last_price(stock)
 
         if last_price is None or last_price <= 0:
             self.log_message(
@@ -191,7 +257,7 @@ class SimpleMomentumBot(Strategy):
         # Create and submit the order
         try:
             order = self.create_order(
-                asset=Asset(symbol=stock),
+                asset=self._get_asset(stock),
                 quantity=quantity,
                 type="market",
                 side="buy",  # Correctly specify the side as a string,
@@ -200,16 +266,17 @@ class SimpleMomentumBot(Strategy):
         except Exception as e:
             self.log_message(f"Error placing order for {stock}: {e}")
 
-    def close_position(self, stock):
+    def close_position(self, stock, position=None):
         """Closes an open position for a specific stock."""
-        position = self.get_position(stock)
+        if position is None:
+            position = self.get_position(stock)
 
         if position and position.quantity > 0:
             self.log_message(
                 f"Closing position for {stock}, Quantity: {position.quantity}")
             try:
                 order = self.create_order(
-                    asset=Asset(symbol=stock),
+                    asset=self._get_asset(stock),
                     quantity=position.quantity,
                     type="market",
                     side="sell",  # Use "sell" to close the position,
@@ -221,34 +288,99 @@ class SimpleMomentumBot(Strategy):
             self.log_message(f"No open position found for {stock} to close.")
 
     # <----------------------------- Additional helper methods ----------------------------->
+    def _update_spy_state(self):
+        """
+        Bring the incremental SPY indicators up to date. The first call replays
+        a year of history; after that only the newest few bars are fetched.
+        """
+        today = self.get_datetime().date()
+        if self._spy_state is not None and self._spy_state_date == today:
+            return self._spy_state
+
+        length = 252 if self._spy_state is None else 5
+        df = self._cached_prices("SPY", length=length)
+        if df is None:
+            return self._spy_state
+        # Folded-in bars can't be revised later, so leave out today's bar
+        # while it may still be forming; it is picked up once complete
+        df = df[df.index.date < today]
+        if df.empty:
+            return self._spy_state
+
+        if self._spy_state is not None and df.index[0] > self._spy_last_bar:
+            # More bars were missed than fetched, so rebuild from a full year
+            self._spy_state = None
+            return self._update_spy_state()
+
+        if self._spy_state is None:
+            self._spy_state = {
+                "sma_50": SMAState(50),
+                "sma_200": SMAState(200),
+                "rsi": RSIState(14),
+                "atr": ATRState(14),
+            }
+        else:
+            df = df[df.index > self._spy_last_bar]
+
+        for high, low, close in zip(df["high"], df["low"], df["close"]):
+            self._spy_state["sma_50"].update(close)
+            self._spy_state["sma_200"].update(close)
+            self._spy_state["rsi"].update(close)
+            self._spy_state["atr"].update(high, low, close)
+        if not df.empty:
+            self._spy_last_bar = df.index[-1]
+        self._spy_state_date = today
+        return self._spy_state
+
     def get_asset_sma_periods(self, stock):
         return self.asset_specific_sma.get(stock,
                                            self.asset_specific_sma["default"])
 
-    def calculate_drawdown(self):
-        portfolio_value = self.get_portfolio_value()
-        self.portfolio_peak = max(self.portfolio_peak, portfolio_value)
+    def calculate_drawdown(self, portfolio_value=None):
+        if portfolio_value is None:
+            portfolio_value = self.get_portfolio_value()
+        if portfolio_value > self.portfolio_peak:
+            self.portfolio_peak = portfolio_value
+        if self.portfolio_peak <= 0:
+            return 0.0  # Nothing to measure against until the account holds value
         drawdown = (portfolio_value -
                     self.portfolio_peak) / self.portfolio_peak * 100
         return drawdown
 
-    def rank_assets(self):
+    def rank_assets(self, top_n=None):
         """
-        Rank assets based on their risk-adjusted momentum.
+        Rank the universe by risk-adjusted momentum, best first, keeping only
+        the first top_n when it is given.
         """
-        scores = {}
+        self._prefetch_prices(self.universe, length=252)
+        closes = {}
+        missing = []
         for stock in self.universe:
+            # Only the fetch is guarded; the scoring below runs on clean data
             try:
-                bars = self.get_historical_prices(stock, length=252)  # 1 year
-                df = bars.df
-                momentum = (df["close"].iloc[-1] / df["close"].iloc[0]) - 1
-                volatility = df["close"].rolling(20).std().iloc[
-                    -1]  # Last 20 days
-                scores[stock] = momentum / volatility
+                df = self._cached_prices(stock, length=252)  # 1 year
             except Exception as e:
                 self.log_message(f"Error fetching data for {stock}: {e}")
                 continue
-        return sorted(scores, key=scores.get, reverse=True)
+            if df is None:
+                missing.append(stock)
+            else:
+                closes[stock] = df["close"]
+        if missing:
+            self.log_message(f"No historical data for {', '.join(missing)}. Skipping.")
+        if not closes:
+            return []
+
+        # One column per stock so every score is computed in a single pass
+        closes = pd.concat(closes, axis=1)
+        # Last 20 days; min_periods=20 keeps rolling(20).std()'s NaN until 20 bars exist
+        scores = calculate_momentum_scores(closes, vol_window=20, min_periods=20).to_numpy()
+
+        # Stable sort keeps universe order on ties, like sorted(..., reverse=True);
+        # scores without a usable volatility can't be ranked and are dropped
+        order = np.argsort(-scores, kind="stable")
+        ranked = [closes.columns[i] for i in order if np.isfinite(scores[i])]
+        return ranked if top_n is None else ranked[:top_n]
 
     def determine_market_condition(self):
         """
@@ -257,32 +389,37 @@ class SimpleMomentumBot(Strategy):
         Returns:
             str: The market condition - "Bull", "Bear", or "Neutral".
         """
+        # SPY only moves once a day, so every call after the first reuses it
+        today = self.get_datetime().date()
+        if self._market_condition_date == today:
+            return self._market_condition
+
         try:
-            spy_data = self.get_historical_prices("SPY", length=252)
-            if not spy_data or spy_data.df.empty:
+            spy = self._update_spy_state()
+            if spy is None:
                 self.log_message("SPY data unavailable. Defaulting to Neutral.")
                 return MarketCondition.Neutral
+            if not spy["sma_200"].ready:
+                self.log_message("Not enough SPY history. Defaulting to Neutral.")
+                return MarketCondition.Neutral
 
-            df = spy_data.df
-
-            # Calculate SMAs
-            df["SMA_50"] = df["close"].rolling(window=50).mean()
-            df["SMA_200"] = df["close"].rolling(window=200).mean()
-            df["ATR"] = calculate_atr(df)
-
-            sma_50 = df["SMA_50"].iloc[-1]
-            sma_200 = df["SMA_200"].iloc[-1]
-            rsi = calculate_rsi(df["close"], period=14).iloc[-1]
-            atr = df["ATR"].iloc[-1]
-            atr_pct = atr / df["close"].iloc[-1]  # ATR as % of price
+            sma_50 = spy["sma_50"].value
+            sma_200 = spy["sma_200"].value
+            rsi = spy["rsi"].value
+            atr_pct = spy["atr"].value / spy["atr"].prev_close  # ATR as % of latest close
 
             # Define market conditions
             if sma_50 > sma_200 and rsi > 50 and atr_pct < 0.02:
-                return MarketCondition.Bullish
+                condition = MarketCondition.Bullish
             elif sma_50 < sma_200 and rsi < 50 and atr_pct > 0.03:
-                return MarketCondition.Bearish
+                condition = MarketCondition.Bearish
             else:
-                return MarketCondition.Neutral
+                condition = MarketCondition.Neutral
+
+            # Fallbacks above are not cached, so missing data is retried
+            self._market_condition = condition
+            self._market_condition_date = today
+            return condition
 
         except Exception as e:
             self.log_message(f"Error in market condition: {e}. Defaulting to Neutral.")
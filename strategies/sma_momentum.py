@@ -1,10 +1,15 @@
 from lumibot.strategies.strategy import Strategy
-from lumibot.entities.asset import Asset
+import logging
+import numpy as np
 import pandas as pd
 
-from strategies.helper import calculate_macd, calculate_rsi, calculate_atr
+from strategies.price_cache import PriceCacheMixin
+from strategies.helper import calculate_adx_last, calculate_macd, calculate_rsi_last, calculate_atr_last, calculate_momentum_scores, last_sma
 
-class SMAMomentumBot(Strategy):
+logger = logging.getLogger(__name__)
+
+
+class SMAMomentumBot(PriceCacheMixin, Strategy):
     """
     A dynamic SMA momentum bot that adjusts its risk per trade based on the detected market condition.
     """
@@ -19,16 +24,30 @@ class SMAMomentumBot(Strategy):
         self.risk_per_trade = self.base_risk_per_trade
         self.asset_specific_sma = {"default": (10, 30)}
         self.market_condition = "Neutral"
+        self._market_condition_date = None
         self.portfolio_peak = 0
+
+        self._init_price_cache(self.universe + ["SPY"])
+
+        # Bars of history requested per symbol, about one trading year
+        self._history_length = 252
+        # Fewer bars than this are too short to trade on at all; a stock whose
+        # history still doesn't cover its SMA windows is skipped when evaluated
+        self._min_history = 50
         # self.force_start_immediately = True # Start the bot immediately after deployment. For testing purpose
 
     def detect_bull_market_trend(self, stock_data):
         prices = stock_data["close"]
+        if len(prices) < 2:
+            return False  # A crossover needs two bars
         macd, signal = calculate_macd(prices)
-        rsi = self.calculate_rsi(prices)
+        rsi = calculate_rsi_last(prices)
 
-        is_macd_bullish = macd.iloc[-1] > signal.iloc[-1] and macd.iloc[-2] <= signal.iloc[-2]
-        is_rsi_bullish = rsi.iloc[-1] > 50
+        # Only the last two values are compared, so read them as plain floats
+        macd_prev, macd_last = macd.to_numpy()[-2:]
+        signal_prev, signal_last = signal.to_numpy()[-2:]
+        is_macd_bullish = macd_last > signal_last and macd_prev <= signal_prev
+        is_rsi_bullish = rsi > 50
         return is_macd_bullish and is_rsi_bullish
     
     def adjust_position_size_for_volatility(self, atr, risk_amount, last_price):
@@ -52,10 +71,10 @@ class SMAMomentumBot(Strategy):
     # 2. Volatility-Based Filters
     def detect_high_volatility(self):        
         spy_data = self.get_valid_data("SPY")
-        if spy_data.empty:
+        if spy_data is None or spy_data.empty:
             return False
 
-        atr = calculate_atr(spy_data).iloc[-1]
+        atr = calculate_atr_last(spy_data)
         volatility_threshold = spy_data["close"].mean() * 0.05
         return atr > volatility_threshold
 
@@ -74,28 +93,17 @@ class SMAMomentumBot(Strategy):
         risk_multipliers = {"Bull": 5.0, "Bear": 0.5, "Flat": 1.0}
         self.risk_per_trade = self.base_risk_per_trade * risk_multipliers.get(self.market_condition, 1.0)
 
-    def get_dynamic_length(self, stock):
-        """Dynamically determine data length based on stock's historical availability."""
-        bars = self.get_historical_prices(Asset(stock, "stock"), length=10)
-        df = bars.df
-        df.dropna()
-
-        if df.empty:
-            return 0
-
-        available_days = len(df)
-
-        return min(252, available_days)
-
     def get_valid_data(self, stock):
-        """Fetch and validate historical price data dynamically."""
-        dynamic_length = self.get_dynamic_length(stock)
-        if dynamic_length == 0:
+        """Fetch and validate historical price data."""
+        # The broker returns whatever history exists up to the requested
+        # length, so a separate availability probe would only double the calls
+        df = self._cached_prices(stock, length=self._history_length)
+        if df is None:
             self.log_message(f"Skipping {stock}: No data available.")
             return None
-        bars = self.get_historical_prices(Asset(stock, "stock"), length=dynamic_length)
-        df = bars.df
-        if df.empty:
+        # Only the price columns matter; derived columns like "return" start with NaN
+        df = df.dropna(subset=["high", "low", "close"])
+        if len(df) < self._min_history:
             self.log_message(f"Skipping {stock}: Insufficient data.")
             return None
         return df
@@ -104,10 +112,11 @@ class SMAMomentumBot(Strategy):
         """
         Filter the universe to include only stocks with sufficient historical data.
         """
+        all_bars = self._prefetch_valid_data(self.universe)
+
         valid_stocks = []
-        for stock in self.universe:
-            bars = self.get_valid_data(stock)
-            if not bars.empty:
+        for stock, bars in zip(self.universe, all_bars):
+            if bars is not None and not bars.empty:
                 valid_stocks.append(stock)
             else:
                 self.log_message(f"Excluding {stock}: Insufficient data.")
@@ -117,73 +126,118 @@ class SMAMomentumBot(Strategy):
         """
         Detect the current market condition based on SPY's SMA slope and trend strength.
         """
+        # SPY only moves once a day, so later calls reuse today's reading
+        today = self.get_datetime().date()
+        if self._market_condition_date == today:
+            self.adjust_risk_based_on_market()
+            return self.market_condition
+
         spy_data = self.get_valid_data("SPY")
-        if not spy_data.empty:
+        if spy_data is None or spy_data.empty:
             self.log_message("SPY data unavailable. Defaulting to Neutral market condition.")
             self.market_condition = "Neutral"
             return self.market_condition
 
-        spy_df = spy_data
-        spy_sma_50 = spy_df["close"].rolling(50).mean()
-        spy_sma_200 = spy_df["close"].rolling(200).mean()
+        close = spy_data["close"].to_numpy(dtype=np.float64)
+        spy_sma_50 = last_sma(close, 50)
+        spy_sma_200 = last_sma(close, 200)
 
-        # Weighted slope for SMA 50
-        recent_slopes = [spy_sma_50.iloc[-i] - spy_sma_50.iloc[-(i + 1)] for i in range(1, 6)]
-        weighted_slope = sum(recent_slopes) / len(recent_slopes)
+        # Weighted slope for SMA 50: the mean of its last five daily changes,
+        # which telescopes to the change since five bars ago
+        weighted_slope = (spy_sma_50 - last_sma(close[:-5], 50)) / 5
 
         # Dynamic thresholds
-        volatility = spy_df["close"].rolling(20).std().iloc[-1]
+        volatility = close[-20:].std(ddof=1) if len(close) >= 20 else np.nan
         slope_threshold = 0.05 if volatility > 1.5 else 0.1
 
         # Determine market condition
-        if weighted_slope > slope_threshold and spy_sma_50.iloc[-1] > spy_sma_200.iloc[-1]:
+        if weighted_slope > slope_threshold and spy_sma_50 > spy_sma_200:
             self.market_condition = "Bull"
-        elif weighted_slope < -slope_threshold and spy_sma_50.iloc[-1] < spy_sma_200.iloc[-1]:
+        elif weighted_slope < -slope_threshold and spy_sma_50 < spy_sma_200:
             self.market_condition = "Bear"
         else:
             self.market_condition = "Flat"
+        self._market_condition_date = today
 
         self.adjust_risk_based_on_market()
         self.log_message(f"Market Condition: {self.market_condition}")
         return self.market_condition
 
-    def get_asset_sma_periods(self, stock):
+    def get_asset_sma_periods(self, stock, bars=None):
         """
         Dynamically adjust SMA periods based on market condition and trend strength.
         """
         if self.market_condition == "Bull":
-            bars = self.get_valid_data(stock)
-            if not bars.empty:
-                adx = calculate_adx(bars)
-                return (15, 40) if adx.iloc[-1] > 25 else (20, 50)
+            if bars is None:
+                bars = self.get_valid_data(stock)
+            if bars is not None and not bars.empty:
+                adx = calculate_adx_last(bars)
+                return (15, 40) if adx > 25 else (20, 50)
         elif self.market_condition == "Bear":
             return (5, 20)
         elif self.market_condition == "Flat":
             return (30, 70)
         return self.asset_specific_sma["default"]
 
-    def rank_assets(self):
+    def rank_assets(self, top_n=None):
         """
-        Rank assets based on their risk-adjusted momentum.
+        Rank assets based on their risk-adjusted momentum, best first.
+        With top_n, only the top_n assets are selected and returned.
         """
-        scores = {}
+        closes = {}
         for stock in self.universe:
             try:
                 bars = self.get_valid_data(stock)
-                if not bars.empty:
-                    df = bars
-                    momentum = (df["close"].iloc[-1] / df["close"].iloc[0]) - 1
-                    volatility = df["close"].rolling(20).std().iloc[-1]
-                    scores[stock] = momentum / volatility
             except Exception as e:
                 self.log_message(f"Error ranking {stock}: {e}")
-        return sorted(scores, key=scores.get, reverse=True)
+                continue
+            if bars is not None and not bars.empty:
+                closes[stock] = bars["close"].to_numpy(dtype=np.float64)
+        if not closes:
+            return []
+
+        symbols = list(closes)
+        # Align each stock's own history on its latest bar, one column per stock,
+        # so all scores come out of a single pass
+        n_bars = max(len(close) for close in closes.values())
+        matrix = np.full((n_bars, len(closes)), np.nan)
+        for j, close in enumerate(closes.values()):
+            matrix[n_bars - len(close):, j] = close
+        # min_periods=20 keeps rolling(20).std()'s NaN until 20 bars exist
+        scores = calculate_momentum_scores(
+            pd.DataFrame(matrix, columns=symbols), vol_window=20, min_periods=20
+        ).to_numpy()
+
+        # Unscorable assets are dropped
+        scores = np.where(np.isfinite(scores), scores, -np.inf)
+        if top_n is not None and top_n < len(scores):
+            # Partition out the top_n first so only those get sorted
+            candidates = np.sort(np.argpartition(-scores, top_n - 1)[:top_n])
+        else:
+            candidates = np.arange(len(scores))
+        # Stable sort keeps universe order on ties
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [symbols[i] for i in order if np.isfinite(scores[i])]
 
     # Core Trading Logic
     def on_trading_iteration(self):
         """
         Main trading logic.
         """
+        # Read account values once; each property may hit the broker
+        portfolio_value, available_cash = self.get_account_value()
+
+        # Check drawdown first; it needs no market data
+        drawdown = self.calculate_drawdown(portfolio_value)
+        self.log_message(f"Drawdown: {drawdown:.2f}%")
+        if drawdown < -20:
+            self.log_message("Drawdown exceeds -20%. Pausing trading.")
+            return
+
+        # Fetch SPY and the universe bars together rather than one at a time;
+        # validation is left to the steps that read them
+        self._prefetch_prices(["SPY"] + self.universe, self._history_length)
+
         # Adjust risk based on market conditions
         self.detect_market_condition()
         self.adjust_for_volatility()
@@ -195,23 +249,15 @@ class SMAMomentumBot(Strategy):
             self.log_message("No valid stocks in universe. Skipping iteration.")
             return
 
-        # Check drawdown
-        drawdown = self.calculate_drawdown()
-        self.log_message(f"Drawdown: {drawdown:.2f}%")
-        if drawdown < -20:
-            self.log_message("Drawdown exceeds -20%. Pausing trading.")
-            return
-
-        # Rank and trade assets
-        ranked_assets = self.rank_assets()
+        # Rank and trade assets; only the top 3 are allocated
+        ranked_assets = self.rank_assets(top_n=3)
         self.log_message(f"Ranked Assets: {ranked_assets}")
         if not ranked_assets:
             self.log_message("No assets ranked. Skipping iteration.")
             return
 
         # Allocate positions to top-ranked assets
-        top_assets = ranked_assets[:3]
-        self.allocate_positions(top_assets)
+        self.allocate_positions(ranked_assets, available_cash)
 
     def on_abrupt_closing(self):
         self.log_message("Abrupt closing")
@@ -221,9 +267,13 @@ class SMAMomentumBot(Strategy):
         """
         Calculate the quantity to be traded based on the allocation and risk per trade.
         """
-        self.log_message(f"Calculating quantity for {stock}: Allocation={allocation}, Risk Per Trade={risk_per_trade}, Available Cash={available_cash}, ATR={atr}, Total Weight={total_weight}, Last Price={last_price}, Calculated Quantity={quantity}")
+        # Debug detail; formatted only when enabled
+        logger.debug(
+            "Calculating quantity for %s: Allocation=%s, Risk Per Trade=%s, Available Cash=%s, ATR=%s, Total Weight=%s, Last Price=%s, Calculated Quantity=%s",
+            stock, allocation, risk_per_trade, available_cash, atr, total_weight, last_price, quantity
+        )
 
-    def allocate_positions(self, top_assets):
+    def allocate_positions(self, top_assets, available_cash=None):
         """
         Allocate positions to top-ranked assets, with enhanced bull market logic.
         """
@@ -232,51 +282,91 @@ class SMAMomentumBot(Strategy):
             "sell": 0
         }
 
-        available_cash = self.cash
-        total_weight = sum(1 / (index + 1) for index in range(len(top_assets)))
-
-        for index, stock in enumerate(top_assets):
-            bars = self.get_valid_data(stock)
-            if bars.empty:
-                self.log_message(f"Skipping {stock}: Insufficient data.")
-                continue
+        if available_cash is None:
+            available_cash = self.cash
+        # Inverse square-root rank weights, normalised so the allocations sum to 1
+        weights = 1 / np.sqrt(np.arange(1, len(top_assets) + 1))
+        total_weight = float(weights.sum())
+        allocations = weights / total_weight
+        risk_budget = available_cash * self.risk_per_trade
 
-            sma_short, sma_long = self.get_asset_sma_periods(stock)
-            sma_short_val = bars["close"].rolling(sma_short).mean().iloc[-1]
-            sma_long_val = bars["close"].rolling(sma_long).mean().iloc[-1]
-            atr = self.calculate_atr(bars).iloc[-1]
-            last_price = self.get_last_price(stock)  # Fetch the last price of the stock
+        # Indicators and quotes for all assets come back together; the
+        # orders below are still submitted in rank order
+        signals = self._pool.map(self._evaluate_stock, top_assets)
 
-            if pd.isna(atr) or atr <= 0:
-                self.log_message(f"{stock} skipped: Invalid ATR ({atr}).")
+        for index, (stock, signal) in enumerate(zip(top_assets, signals)):
+            if signal is None:
                 continue
-            if last_price <= 0:
-                self.log_message(f"{stock} skipped: Invalid Last Price ({last_price}).")
+            sma_short_val = signal["sma_short"]
+            sma_long_val = signal["sma_long"]
+            atr = signal["atr"]
+            last_price = signal["last_price"]
+            position = signal["position"]
+            current_quantity = position.quantity if position else 0
+
+            # A held position only needs sizing on a bullish crossover; otherwise
+            # it closes on a bearish one or is held (flat or undefined SMAs)
+            if current_quantity > 0 and not sma_short_val > sma_long_val:
+                if sma_short_val < sma_long_val:
+                    self.close_position(stock, last_price, position)
+                    total_tradings["sell"] += 1
                 continue
 
-            allocation = 1 / (index + 1)**0.5 / total_weight
-            risk_amount = available_cash * self.risk_per_trade * allocation
+            allocation = float(allocations[index])
+            risk_amount = risk_budget * allocation
 
             # Adjust position size using updated method
             quantity = self.adjust_position_size_for_volatility(atr, risk_amount, last_price)
-
-            position = self.get_position(stock)
-            current_quantity = position.quantity if position else 0
             self.log_position(stock, allocation, self.risk_per_trade, available_cash, atr, total_weight, last_price, quantity)
 
             if current_quantity > 0:
-                if sma_short_val > sma_long_val:
+                if sma_short_val > sma_long_val and quantity > 0:
                     self.place_trade(stock, quantity, atr, last_price)
                     total_tradings["buy"] += 1
-                elif sma_short_val < sma_long_val:
-                    self.close_position(stock, last_price)
-                    total_tradings["sell"] += 1
             else:
                 self.log_message(f"Quantity for {stock}: {quantity}. Skipping trade.")
 
         if total_tradings["buy"] == 0 and total_tradings["sell"] == 0:
             self.log_message("No trades placed for the day.")
 
+    def _evaluate_stock(self, stock):
+        """
+        Gather the indicators, last price and position for one stock. Runs on
+        the thread pool, so it only reads data; returns None to skip the stock.
+        """
+        bars = self.get_valid_data(stock)
+        if bars is None or bars.empty:
+            self.log_message(f"Skipping {stock}: Insufficient data.")
+            return None
+
+        # Check ATR first: it only needs the bars, so a degenerate value
+        # skips the ADX work and the last-price request
+        atr = calculate_atr_last(bars)
+        if pd.isna(atr) or atr <= 0:
+            self.log_message(f"{stock} skipped: Invalid ATR ({atr}).")
+            return None
+
+        sma_short, sma_long = self.get_asset_sma_periods(stock, bars)
+        close = bars["close"].to_numpy(dtype=np.float64)
+        sma_short_val = last_sma(close, sma_short)
+        sma_long_val = last_sma(close, sma_long)
+        if not (np.isfinite(sma_short_val) and np.isfinite(sma_long_val)):
+            self.log_message(f"{stock} skipped: {len(close)} bars don't cover SMA({sma_short}, {sma_long}).")
+            return None
+
+        last_price = self.get_last_price(stock)  # Fetch the last price of the stock
+        if last_price is None or last_price <= 0:
+            self.log_message(f"{stock} skipped: Invalid Last Price ({last_price}).")
+            return None
+
+        return {
+            "sma_short": sma_short_val,
+            "sma_long": sma_long_val,
+            "atr": atr,
+            "last_price": last_price,
+            "position": self.get_position(stock),
+        }
+
     def get_account_value(self):
         """
         Get the current account value and cash available.
@@ -302,16 +392,18 @@ class SMAMomentumBot(Strategy):
         self.log_message("After Market Closes")
         self.log_message(f"Portfolio Value: {value}")
         self.log_message(f"Cash Available: {cash}")
+        self._clear_price_cache()
 
-    def place_trade(self, stock, quantity, atr, last_price):
+    def place_trade(self, stock, quantity, atr, last_price=None):
         """
         Place a trade with the specified quantity and risk management parameters.
         """
         if quantity <= 0:
             return
 
-        last_price = self.get_last_price(stock)
-        if last_price <= 0:
+        if last_price is None:
+            last_price = self.get_last_price(stock)
+        if last_price is None or last_price <= 0:
             return
 
         stop_loss_price = last_price - 1.5 * atr
@@ -319,7 +411,7 @@ class SMAMomentumBot(Strategy):
 
         self.log_message(f"Placing trade for {stock} (${last_price}/per share) with current cash at {self.cash}: Quantity={quantity}, ATR={atr}, Last Price={last_price}")
         order = self.create_order(
-            asset=Asset(symbol=stock),
+            asset=self._get_asset(stock),
             quantity=quantity,
             type="market",
             side="buy",
@@ -331,15 +423,16 @@ class SMAMomentumBot(Strategy):
         except Exception as e:
             self.log_message(f"Error placing trade for {stock}: {e}")
 
-    def close_position(self, stock, last_price):
+    def close_position(self, stock, last_price, position=None):
         """
         Close the position for the specified stock.
         """
-        position = self.get_position(stock)
+        if position is None:
+            position = self.get_position(stock)
         if position and position.quantity > 0:
             self.log_message(f"Closing position for {stock} (${last_price}/per share): Quantity={position.quantity}")
             order = self.create_order(
-                asset=Asset(symbol=stock),
+                asset=self._get_asset(stock),
                 quantity=position.quantity,
                 type="market",
                 side="sell",
@@ -349,11 +442,23 @@ class SMAMomentumBot(Strategy):
             except Exception as e:
                 self.log_message(f"Error closing position for {stock}: {e}")
 
-    def calculate_drawdown(self):
+    def _prefetch_valid_data(self, symbols):
+        """
+        Load validated price data for several symbols at once: the bars are
+        fetched together, then validated on the pool.
+        """
+        self._prefetch_prices(symbols, self._history_length)
+        return list(self._pool.map(self.get_valid_data, symbols))
+
+    def calculate_drawdown(self, portfolio_value=None):
         """
         Calculate the current drawdown.
         """
-        portfolio_value = self.portfolio_value
-        self.portfolio_peak = max(self.portfolio_peak, portfolio_value)
+        if portfolio_value is None:
+            portfolio_value = self.portfolio_value
+        if portfolio_value > self.portfolio_peak:
+            self.portfolio_peak = portfolio_value
+        if self.portfolio_peak <= 0:
+            return 0.0  # No peak yet, e.g. an empty account
         return (portfolio_value - self.portfolio_peak) / self.portfolio_peak * 100
 
@@ -4,6 +4,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from lumibot.backtesting import YahooDataBacktesting
 from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
 
 # Add the root directory of the project to PYTHONPATH
 from strategies.sma_momentum import SMAMomentumBot
@@ -58,19 +59,55 @@ testing_timelines = {
 }
 
 
-# Run backtests for each timeline
-for test_name, params in testing_timelines.items():
-    print(f"Running backtest for: {test_name}")
-
+def run_backtest(test_name, params, show_results=False):
+    """
+    Run one timeline. Plots and tearsheets are only opened when asked for, so
+    parallel runs don't each open browser windows.
+    """
     results = SimpleMomentumBot.run_backtest(
         YahooDataBacktesting,
         backtesting_start=params["start_date"],
         backtesting_end=params["end_date"],
         budget=5000,  # Adjust budget as needed
         name="SimpleMomentumBot during " + test_name,
-        show_plot=True,
-        show_tearsheet=True
+        show_plot=show_results,
+        show_tearsheet=show_results
     )
-    print(f"Results for {test_name}:")
-    print(results)
-    print("\n")
\ No newline at end of file
+    # Newer lumibot releases also return the strategy instance; it holds a
+    # thread pool and broker handles, so only the results go back to the parent
+    if isinstance(results, tuple):
+        results = results[0]
+    return results
+
+
+# Usage:
+#   python tests/backtest_sma.py                 run every timeline in parallel
+#   python tests/backtest_sma.py "YTD" "2024"    run the named timelines in parallel
+#   python tests/backtest_sma.py "YTD"           run one timeline and show its plot and tearsheet
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(testing_timelines)
+    unknown = [test_name for test_name in selected if test_name not in testing_timelines]
+    if unknown:
+        sys.exit(f"Unknown timelines: {', '.join(unknown)}. Choose from: {', '.join(testing_timelines)}")
+
+    if len(selected) == 1:
+        test_name = selected[0]
+        print(f"Running backtest for: {test_name}")
+        results = run_backtest(test_name, testing_timelines[test_name], show_results=True)
+        print(f"Results for {test_name}:")
+        print(results)
+        sys.exit()
+
+    # Each backtest is independent of the others, so they run side by side
+    with ProcessPoolExecutor(max_workers=min(len(selected), os.cpu_count() or 1)) as pool:
+        futures = {}
+        for test_name in selected:
+            print(f"Running backtest for: {test_name}")
+            futures[test_name] = pool.submit(run_backtest, test_name, testing_timelines[test_name])
+        for test_name, future in futures.items():
+            print(f"Results for {test_name}:")
+            try:
+                print(future.result())
+            except Exception as e:
+                print(f"Backtest failed: {e}")
+            print("\n")
@@ -0,0 +1,59 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import pandas as pd
+
+# Add the root directory of the project to PYTHONPATH
+from strategies import helper
+
+try:
+    import numba
+    print(f"Numba {numba.__version__} enabled")
+except ImportError:
+    print("Numba not installed; checking the plain Python kernels")
+
+# A year of random-walk bars, shaped like lumibot's Bars.df
+rng = np.random.default_rng(0)
+close = 100 + rng.normal(0, 1, 252).cumsum()
+df = pd.DataFrame({
+    "open": close,
+    "high": close + rng.uniform(0, 2, 252),
+    "low": close - rng.uniform(0, 2, 252),
+    "close": close,
+    "volume": rng.integers(1_000, 10_000, 252),
+}, index=pd.date_range("2024-01-01", periods=252, freq="B"))
+
+# A wide close frame like the ones rank_assets builds, from a single-column concat
+closes = pd.concat({"SPY": df["close"]}, axis=1)
+
+# Each helper must accept the read-only arrays pandas hands out
+checks = {
+    "calculate_macd": lambda: helper.calculate_macd(df["close"])[1].iloc[-1],
+}
+
+# The *_last wrappers must agree with the last value of the full series
+last_checks = {
+    "calculate_atr_last": (lambda: helper.calculate_atr_last(df), lambda: helper.calculate_atr(df).iloc[-1]),
+    "calculate_rsi_last": (lambda: helper.calculate_rsi_last(df["close"]), lambda: helper.calculate_rsi(df["close"]).iloc[-1]),
+    "calculate_adx_last": (lambda: helper.calculate_adx_last(df), lambda: helper.calculate_adx(df).iloc[-1]),
+    "calculate_momentum_scores": (
+        lambda: helper.calculate_momentum_scores(closes, vol_window=20, min_periods=20).to_numpy(),
+        lambda: ((closes.iloc[-1] / closes.iloc[0] - 1) / closes.rolling(20).std().iloc[-1]).to_numpy(),
+    ),
+}
+
+for name, check in checks.items():
+    try:
+        print(f"{name}: {check()}")
+    except Exception as e:
+        print(f"{name} failed: {e}")
+
+for name, (last, full) in last_checks.items():
+    try:
+        value, expected = last(), full()
+        status = "OK" if np.allclose(value, expected, equal_nan=True) else f"MISMATCH (expected {expected})"
+        print(f"{name}: {value} {status}")
+    except Exception as e:
+        print(f"{name} failed: {e}")